@@ -1,7 +1,81 @@
 """Database helper functions"""
 
 import os
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# Connection-level tuning applied once when a pooled connection is opened.
+# Sized for ~100 threadpool workers each holding a connection.
+CONNECTION_PRAGMAS = [
+    "PRAGMA cache_size=-4096",  # 4 MB page cache
+    "PRAGMA mmap_size=67108864",  # 64 MB memory-mapped I/O (shared OS pages)
+    "PRAGMA temp_store=MEMORY",
+]
+
+# Refuse writes even if a statement slips past validation
+READ_ONLY_PRAGMAS = [
+    "PRAGMA query_only=1",
+]
 
 def get_database_path() -> str:
     """Get database path from environment or default"""
     return os.getenv("DATABASE_PATH", "data/sample.db")
+
+class _ConnPool:
+    """Long-lived read-only SQLite connections, one per (thread, db_path)
+    
+    Each thread keeps at most max_per_thread connections; the least recently
+    used one is closed when another db_path is opened.
+    """
+    
+    def __init__(self, busy_timeout: int = 30, max_per_thread: int = 2):
+        self.busy_timeout = busy_timeout
+        self.max_per_thread = max_per_thread
+        self._local = threading.local()
+    
+    def get(self, db_path: str) -> sqlite3.Connection:
+        """Return the calling thread's connection for db_path, opening it on first use"""
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = OrderedDict()
+        
+        conn = conns.get(db_path)
+        if conn is not None:
+            conns.move_to_end(db_path)
+            return conn
+        
+        conn = self._connect(db_path)
+        conns[db_path] = conn
+        logger.info(f"Opened pooled read-only connection to {db_path}")
+        
+        while len(conns) > self.max_per_thread:
+            old_path, old_conn = conns.popitem(last=False)
+            old_conn.close()
+            logger.info(f"Closed pooled connection to {old_path}")
+        
+        return conn
+    
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        """Open and tune a new connection"""
+        # mode=ro skips journal setup and never creates a missing database
+        uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout)
+        
+        try:
+            for pragma in CONNECTION_PRAGMAS + READ_ONLY_PRAGMAS:
+                conn.execute(pragma)
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"Could not tune connection for {db_path}: {str(e)}")
+        
+        return conn
+
+_pool = _ConnPool()
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Get this thread's pooled read-only connection to db_path (do not close it)"""
+    return _pool.get(db_path)
@@ -5,10 +5,16 @@ Created: December 2025
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Literal
 import os
+import json
 import logging
+import asyncio
+import anyio
 
 from app.services.schema_service import SchemaService
 from app.services.nl2sql_service import NL2SQLService
@@ -16,6 +22,9 @@ from app.services.sql_validator import SQLValidator
 from app.services.query_executor import QueryExecutor
 from app.services.explanation_service import ExplanationService
 from app.services.memory_service import MemoryService
+from app.services.llm_cache import LLMCache
+from app.services.llm_client import create_groq_client, create_async_groq_client
+from app.services.semantic_cache import SemanticCache
 from app.db.database import get_database_path
 
 # Configure logging
@@ -29,7 +38,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="OpenNL2SQL API",
     description="AI-powered Natural Language to SQL Analytics System",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration
@@ -41,11 +51,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip responses except Server-Sent Events, which must reach the client per event"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress large JSON bodies (query results are highly repetitive)
+app.add_middleware(JSONGZipMiddleware, minimum_size=1000)
+
 # Request/Response Models
 class QueryRequest(BaseModel):
     question: str
     session_id: Optional[str] = None
     db_path: Optional[str] = None
+    limit: Optional[int] = Field(None, ge=1, le=SQLValidator.MAX_ROWS)
 
 class QueryResponse(BaseModel):
     success: bool
@@ -56,14 +79,46 @@ class QueryResponse(BaseModel):
     error: Optional[str] = None
     session_id: str
 
+class BatchOp(BaseModel):
+    op: Literal["query", "ping"]
+    question: Optional[str] = None
+    session_id: Optional[str] = None
+    db_path: Optional[str] = None
+    limit: Optional[int] = Field(None, ge=1, le=SQLValidator.MAX_ROWS)
+    
+    @model_validator(mode="after")
+    def require_question(self):
+        if self.op == "query" and not (self.question or "").strip():
+            raise ValueError("question is required for op 'query'")
+        return self
+
+class BatchRequest(BaseModel):
+    ops: List[BatchOp] = Field(..., min_length=1, max_length=10)
+
 # Initialize services
+llm_cache = LLMCache(db_path=os.getenv("LLM_CACHE_PATH"))
+groq_client = create_groq_client()
+async_groq_client = create_async_groq_client()
 schema_service = SchemaService()
-nl2sql_service = NL2SQLService()
+semantic_cache = SemanticCache() if os.getenv("SEMANTIC_CACHE", "true").lower() == "true" else None
+nl2sql_service = NL2SQLService(client=groq_client, cache=llm_cache, semantic_cache=semantic_cache)
 sql_validator = SQLValidator()
 query_executor = QueryExecutor()
-explanation_service = ExplanationService()
+explanation_service = ExplanationService(client=async_groq_client, cache=llm_cache)
 memory_service = MemoryService()
 
+@app.on_event("startup")
+async def configure_threadpool():
+    """Size the worker threadpool used for blocking SQLite and Groq calls"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(os.getenv("THREADPOOL_SIZE", "100"))
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """Release the shared Groq connection pools"""
+    groq_client.close()
+    await async_groq_client.close()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -73,8 +128,13 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/health")
+async def health():
+    """Lightweight liveness probe; the frontend calls it to pre-open connections"""
+    return {"status": "healthy"}
+
 @app.get("/schema")
-async def get_schema(db_path: Optional[str] = None):
+def get_schema(db_path: Optional[str] = None):
     """Get database schema"""
     try:
         db = db_path or get_database_path()
@@ -87,7 +147,55 @@ async def get_schema(db_path: Optional[str] = None):
         logger.error(f"Schema error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/query", response_model=QueryResponse)
+async def execute_with_recovery(sql: str, schema: Dict[str, Any], db_path: str, limit: Optional[int] = None) -> Tuple[str, Optional[List[Dict[str, Any]]], Optional[str], Optional[str]]:
+    """Validate and execute SQL, retrying once with LLM-corrected SQL on failure
+    
+    Args:
+        limit: Optional client row cap enforced through the SQL LIMIT
+    
+    Returns:
+        Tuple of (sql actually run, results, error message or None, model SQL
+        that succeeded before normalization, or None on failure)
+    """
+    model_sql = sql
+    
+    # Validate SQL; the validator returns a normalized query with LIMIT enforced
+    validation = sql_validator.validate(sql, limit)
+    if not validation["valid"]:
+        return sql, None, f"Invalid SQL: {validation['error']}", None
+    sql = validation["sql"]
+    
+    try:
+        results = await run_in_threadpool(query_executor.execute, sql, db_path)
+        return sql, results, None, model_sql
+    except Exception as exec_error:
+        logger.warning(f"SQL execution failed: {str(exec_error)}")
+        
+        # Auto-recovery: regenerate SQL with error feedback
+        logger.info("Attempting auto-recovery...")
+        corrected_sql = await run_in_threadpool(
+            nl2sql_service.fix_sql,
+            original_sql=sql,
+            error=str(exec_error),
+            schema=schema
+        )
+        
+        # Validate corrected SQL
+        corrected_validation = sql_validator.validate(corrected_sql, limit)
+        if not corrected_validation["valid"]:
+            return sql, None, f"Auto-recovery failed: {corrected_validation['error']}", None
+        model_sql = corrected_sql
+        corrected_sql = corrected_validation["sql"]
+        
+        # Retry execution
+        try:
+            results = await run_in_threadpool(query_executor.execute, corrected_sql, db_path)
+            logger.info("Auto-recovery successful!")
+            return corrected_sql, results, None, model_sql
+        except Exception as retry_error:
+            return sql, None, f"Query failed after auto-recovery: {str(retry_error)}", None
+
+@app.post("/query", response_model=QueryResponse, response_class=ORJSONResponse)
 async def process_query(request: QueryRequest):
     """Process natural language query with auto-recovery"""
     session_id = request.session_id or memory_service.create_session()
@@ -96,78 +204,43 @@ async def process_query(request: QueryRequest):
         # Get database path
         db_path = request.db_path or get_database_path()
         
-        # Get schema
-        schema = schema_service.get_schema(db_path)
+        # Get schema (blocking calls run in the threadpool to keep the event loop free)
+        schema = await run_in_threadpool(schema_service.get_schema, db_path)
         
         # Get conversation context
         context = memory_service.get_context(session_id)
         
         # Generate SQL
         logger.info(f"Generating SQL for: {request.question}")
-        sql = nl2sql_service.generate_sql(
+        sql = await run_in_threadpool(
+            nl2sql_service.generate_sql,
             question=request.question,
             schema=schema,
             context=context
         )
         
-        # Validate SQL
-        validation = sql_validator.validate(sql)
-        if not validation["valid"]:
+        # Execute with auto-recovery
+        sql, results, error, model_sql = await execute_with_recovery(sql, schema, db_path, request.limit)
+        if error:
             return QueryResponse(
                 success=False,
-                error=f"Invalid SQL: {validation['error']}",
+                error=error,
                 session_id=session_id
             )
         
-        # Execute with auto-recovery
-        results = None
-        error_occurred = False
+        # Only SQL that validated and ran (after any correction) is reused
+        await run_in_threadpool(nl2sql_service.remember_sql, request.question, schema, context, model_sql)
         
-        try:
-            results = query_executor.execute(sql, db_path)
-        except Exception as exec_error:
-            logger.warning(f"SQL execution failed: {str(exec_error)}")
-            error_occurred = True
-            
-            # Auto-recovery: regenerate SQL with error feedback
-            logger.info("Attempting auto-recovery...")
-            corrected_sql = nl2sql_service.fix_sql(
-                original_sql=sql,
-                error=str(exec_error),
-                schema=schema
-            )
-            
-            # Validate corrected SQL
-            corrected_validation = sql_validator.validate(corrected_sql)
-            if not corrected_validation["valid"]:
-                return QueryResponse(
-                    success=False,
-                    error=f"Auto-recovery failed: {corrected_validation['error']}",
-                    session_id=session_id
-                )
-            
-            # Retry execution
-            try:
-                results = query_executor.execute(corrected_sql, db_path)
-                sql = corrected_sql  # Use corrected SQL
-                logger.info("Auto-recovery successful!")
-            except Exception as retry_error:
-                return QueryResponse(
-                    success=False,
-                    error=f"Query failed after auto-recovery: {str(retry_error)}",
-                    session_id=session_id
-                )
-        
-        # Generate explanations
-        sql_explanation = explanation_service.explain_sql(sql, request.question)
-        results_explanation = explanation_service.explain_results(results, request.question)
+        # Generate both explanations in a single LLM round-trip
+        sql_explanation, results_explanation = await explanation_service.explain_both(
+            sql, results, request.question
+        )
         
         # Store in memory
         memory_service.add_interaction(
             session_id=session_id,
             question=request.question,
-            sql=sql,
-            results=results
+            sql=sql
         )
         
         return QueryResponse(
@@ -187,8 +260,99 @@ async def process_query(request: QueryRequest):
             session_id=session_id
         )
 
+async def run_batch_op(op: BatchOp) -> Dict[str, Any]:
+    """Run a single batched operation"""
+    if op.op == "query":
+        response = await process_query(QueryRequest(
+            question=op.question,
+            session_id=op.session_id,
+            db_path=op.db_path,
+            limit=op.limit
+        ))
+        return response.model_dump()
+    return await root()
+
+@app.post("/batch")
+async def process_batch(request: BatchRequest):
+    """Run several operations in one round-trip; results are returned in request order"""
+    results = await asyncio.gather(*(run_batch_op(op) for op in request.ops))
+    return {"results": results}
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def query_events(request: QueryRequest, session_id: str) -> AsyncIterator[str]:
+    """Run the query pipeline, yielding SSE events as each stage completes
+    
+    Event order: session, schema, sql_token*, sql, results,
+    sql_explanation_token*, results_explanation_token*, done (or error).
+    """
+    yield sse_event("session", {"session_id": session_id})
+    
+    try:
+        db_path = request.db_path or get_database_path()
+        schema = await run_in_threadpool(schema_service.get_schema, db_path)
+        yield sse_event("schema", {"tables": list(schema)})
+        
+        context = memory_service.get_context(session_id)
+        
+        logger.info(f"Streaming SQL for: {request.question}")
+        sql = None
+        async for item in iterate_in_threadpool(
+            nl2sql_service.stream_sql(request.question, schema, context)
+        ):
+            if "token" in item:
+                yield sse_event("sql_token", item["token"])
+            else:
+                sql = item["sql"]
+        
+        sql, results, error, model_sql = await execute_with_recovery(sql, schema, db_path, request.limit)
+        if error:
+            yield sse_event("error", {"error": error})
+            return
+        
+        await run_in_threadpool(nl2sql_service.remember_sql, request.question, schema, context, model_sql)
+        
+        yield sse_event("sql", {"sql": sql})
+        yield sse_event("results", {"results": results})
+        
+        sql_explanation = []
+        async for token in explanation_service.stream_explain_sql(sql, request.question):
+            sql_explanation.append(token)
+            yield sse_event("sql_explanation_token", token)
+        
+        results_explanation = []
+        async for token in explanation_service.stream_explain_results(results, request.question, sql):
+            results_explanation.append(token)
+            yield sse_event("results_explanation_token", token)
+        
+        memory_service.add_interaction(
+            session_id=session_id,
+            question=request.question,
+            sql=sql
+        )
+        
+        yield sse_event("done", {
+            "sql_explanation": "".join(sql_explanation).strip(),
+            "results_explanation": "".join(results_explanation).strip()
+        })
+        
+    except Exception as e:
+        logger.error(f"Streaming query error: {str(e)}")
+        yield sse_event("error", {"error": str(e)})
+
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """Process natural language query, streaming progress as Server-Sent Events"""
+    session_id = request.session_id or memory_service.create_session()
+    return StreamingResponse(
+        query_events(request, session_id),
+        media_type="text/event-stream"
+    )
+
 @app.get("/sessions/{session_id}")
-async def get_session(session_id: str):
+def get_session(session_id: str):
     """Get session history"""
     try:
         context = memory_service.get_context(session_id)
@@ -201,5 +365,21 @@ async def get_session(session_id: str):
         raise HTTPException(status_code=404, detail="Session not found")
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    # Sessions and caches live in-process, so keep one worker unless that
+    # state is moved out (e.g. Redis/SQLite) before raising WEB_CONCURRENCY
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    
+    # Serve this module's app directly; an import string would load the module
+    # again and build every service (Groq pools, caches, embedding model) twice.
+    # Multiple workers need the import string, as each worker imports the app itself.
+    uvicorn.run(
+        app if workers == 1 else "app.main:app",
+        host=os.getenv("BACKEND_HOST", "0.0.0.0"),
+        port=int(os.getenv("BACKEND_PORT", "8000")),
+        workers=workers,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools"
+    )
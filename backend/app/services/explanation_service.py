@@ -1,86 +1,271 @@
 """Explanation Service - Generates plain English explanations"""
 
-import os
-from typing import List, Dict, Any
+import json
+import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import logging
-from groq import Groq
+import sqlglot
+from sqlglot import exp
+from groq import AsyncGroq
+
+from app.services.llm_cache import LLMCache
+from app.services.llm_client import create_async_groq_client
 
 logger = logging.getLogger(__name__)
 
 class ExplanationService:
     """Generates human-readable explanations using LLM"""
     
-    def __init__(self):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
-        self.model = "mixtral-8x7b-32768"
+    SQL_FALLBACK = "This query retrieves data from the database based on your question."
+    
+    # Low enough for LLMCache to replay repeated explanations
+    TEMPERATURE = 0.1
+    
+    # Result preview sent to the LLM
+    PREVIEW_ROWS = 5
+    PREVIEW_MAX_CHARS = 80
+    
+    # Results this small are described from a template instead of the LLM;
+    # wider rows or longer text are left to the LLM summary
+    TEMPLATE_MAX_ROWS = 3
+    TEMPLATE_MAX_COLUMNS = 4
+    TEMPLATE_MAX_CHARS = 300
+    
+    # Wording for single-aggregate results
+    AGGREGATE_LABELS = {
+        exp.Count: "count",
+        exp.Sum: "total",
+        exp.Avg: "average",
+        exp.Min: "minimum",
+        exp.Max: "maximum"
+    }
+    
+    def __init__(self, client: Optional[AsyncGroq] = None, cache: Optional[LLMCache] = None):
+        self.client = client or create_async_groq_client()
+        self.model = "llama-3.1-8b-instant"
+        self.cache = cache or LLMCache()
     
-    def explain_sql(self, sql: str, question: str) -> str:
+    async def explain_sql(self, sql: str, question: str) -> str:
         """Explain what the SQL query does in plain English"""
         
-        prompt = f"""You are a SQL expert explaining queries to non-technical users.
-
-User asked: "{question}"
-
-Generated SQL:
-{sql}
-
-Explain in 2-3 simple sentences what this SQL query does. Be clear and concise.
-
-Explanation:"""
-        
         try:
-            response = self.client.chat.completions.create(
+            explanation = await self.cache.acomplete(
+                self.client,
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
+                prompt=self._sql_prompt(sql, question),
+                temperature=self.TEMPERATURE,
                 max_tokens=200
             )
-            
-            explanation = response.choices[0].message.content.strip()
             logger.info("Generated SQL explanation")
             return explanation
             
         except Exception as e:
             logger.error(f"Explanation generation failed: {str(e)}")
-            return "This query retrieves data from the database based on your question."
+            return self.SQL_FALLBACK
     
-    def explain_results(self, results: List[Dict[str, Any]], question: str) -> str:
+    async def explain_results(self, results: List[Dict[str, Any]], question: str, sql: Optional[str] = None) -> str:
         """Explain query results in natural language"""
         
+        templated = self._templated_results_explanation(results, sql)
+        if templated:
+            return templated
+        
+        try:
+            explanation = await self.cache.acomplete(
+                self.client,
+                model=self.model,
+                prompt=self._results_prompt(results, question),
+                temperature=self.TEMPERATURE,
+                max_tokens=250
+            )
+            logger.info("Generated results explanation")
+            return explanation
+            
+        except Exception as e:
+            logger.error(f"Results explanation failed: {str(e)}")
+            return f"Found {len(results)} result(s) matching your query."
+    
+    async def explain_both(self, sql: str, results: List[Dict[str, Any]], question: str) -> Tuple[str, str]:
+        """Explain the SQL and its results with a single LLM call
+        
+        Falls back to separate explain_sql/explain_results calls if the
+        combined response is not the expected JSON object.
+        
+        Returns:
+            Tuple of (sql_explanation, results_explanation)
+        """
+        
+        templated = self._templated_results_explanation(results, sql)
+        if templated:
+            return await self.explain_sql(sql, question), templated
+        
+        try:
+            content = await self.cache.acomplete(
+                self.client,
+                model=self.model,
+                prompt=self._combined_prompt(sql, results, question),
+                temperature=self.TEMPERATURE,
+                max_tokens=450,
+                response_format={"type": "json_object"}
+            )
+            explanations = json.loads(content)
+            sql_explanation = explanations["sql_explanation"].strip()
+            results_explanation = explanations["results_explanation"].strip()
+            logger.info("Generated combined explanation")
+            return sql_explanation, results_explanation
+            
+        except Exception as e:
+            logger.warning(f"Combined explanation failed, falling back to separate calls: {str(e)}")
+            return tuple(await asyncio.gather(
+                self.explain_sql(sql, question),
+                self.explain_results(results, question, sql)
+            ))
+    
+    async def stream_explain_sql(self, sql: str, question: str) -> AsyncIterator[str]:
+        """Stream the SQL explanation token by token"""
+        
+        streamed = False
+        try:
+            async for delta in self.cache.astream(
+                self.client,
+                model=self.model,
+                prompt=self._sql_prompt(sql, question),
+                temperature=self.TEMPERATURE,
+                max_tokens=200
+            ):
+                streamed = True
+                yield delta
+        except Exception as e:
+            logger.error(f"Explanation generation failed: {str(e)}")
+            if not streamed:
+                yield self.SQL_FALLBACK
+    
+    async def stream_explain_results(self, results: List[Dict[str, Any]], question: str, sql: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream the results explanation token by token"""
+        
+        templated = self._templated_results_explanation(results, sql)
+        if templated:
+            yield templated
+            return
+        
+        streamed = False
+        try:
+            async for delta in self.cache.astream(
+                self.client,
+                model=self.model,
+                prompt=self._results_prompt(results, question),
+                temperature=self.TEMPERATURE,
+                max_tokens=250
+            ):
+                streamed = True
+                yield delta
+        except Exception as e:
+            logger.error(f"Results explanation failed: {str(e)}")
+            if not streamed:
+                yield f"Found {len(results)} result(s) matching your query."
+    
+    def _templated_results_explanation(self, results: List[Dict[str, Any]], sql: Optional[str] = None) -> Optional[str]:
+        """Explain empty, aggregate and small results without the LLM
+        
+        Returns None when the result needs an LLM summary.
+        """
+        
         if not results:
             return "No results found for your query."
         
-        row_count = len(results)
-        
-        if row_count == 1 and len(results[0]) == 1:
+        if len(results) == 1 and len(results[0]) == 1:
             # Single value result (e.g., COUNT)
             value = list(results[0].values())[0]
+            aggregate = self._describe_aggregate(sql) if sql else None
+            if aggregate:
+                return f"The {aggregate} is {value}."
             return f"The answer is: {value}"
         
-        prompt = f"""Summarize these query results in 2-3 simple sentences.
+        if len(results) > self.TEMPLATE_MAX_ROWS or len(results[0]) > self.TEMPLATE_MAX_COLUMNS:
+            return None
+        
+        # Long strings are cut to PREVIEW_MAX_CHARS, as in the LLM prompt
+        rows = self._preview(results)
+        if len(rows[0]) == 1:
+            items = [str(next(iter(row.values()))) for row in rows]
+        else:
+            items = [", ".join(f"{key}: {value}" for key, value in row.items()) for row in rows]
+        
+        explanation = f"Found {len(results)} result(s): " + "; ".join(items) + "."
+        if len(explanation) > self.TEMPLATE_MAX_CHARS:
+            return None
+        return explanation
+    
+    def _describe_aggregate(self, sql: str) -> Optional[str]:
+        """Name a lone COUNT/SUM/AVG/MIN/MAX projection, e.g. average of price"""
+        try:
+            tree = sqlglot.parse_one(sql, read="sqlite")
+        except sqlglot.errors.ParseError:
+            return None
+        
+        if not isinstance(tree, exp.Select) or len(tree.expressions) != 1:
+            return None
+        
+        projection = tree.expressions[0].unalias()
+        label = self.AGGREGATE_LABELS.get(type(projection))
+        if label is None:
+            return None
+        
+        target = projection.this
+        if isinstance(target, exp.Column):
+            return f"{label} of {target.name}"
+        if isinstance(target, exp.Distinct) and len(target.expressions) == 1 and isinstance(target.expressions[0], exp.Column):
+            return f"{label} of distinct {target.expressions[0].name}"
+        return label
+    
+    def _preview(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """First rows of the results with long strings truncated for the prompt"""
+        return [
+            {
+                key: value[:self.PREVIEW_MAX_CHARS] if isinstance(value, str) else value
+                for key, value in row.items()
+            }
+            for row in results[:self.PREVIEW_ROWS]
+        ]
+    
+    def _sql_prompt(self, sql: str, question: str) -> str:
+        """Build the SQL explanation prompt"""
+        return f"""You are a SQL expert explaining queries to non-technical users.
 
 User asked: "{question}"
 
-Results ({row_count} rows):
-{str(results[:5])}
+Generated SQL:
+{sql}
+
+Explain in 2-3 simple sentences what this SQL query does. Be clear and concise.
+
+Explanation:"""
+    
+    def _combined_prompt(self, sql: str, results: List[Dict[str, Any]], question: str) -> str:
+        """Build the prompt asking for both explanations as JSON"""
+        return f"""You are a SQL expert explaining a query and its results to non-technical users.
+
+User asked: "{question}"
+
+Generated SQL:
+{sql}
+
+Results ({len(results)} rows):
+{str(self._preview(results))}
+
+Respond with a JSON object with two keys:
+- "sql_explanation": 2-3 simple sentences explaining what the SQL query does
+- "results_explanation": 2-3 simple sentences summarizing the results
+
+JSON:"""
+    
+    def _results_prompt(self, results: List[Dict[str, Any]], question: str) -> str:
+        """Build the results summary prompt"""
+        return f"""Summarize these query results in 2-3 simple sentences.
+
+User asked: "{question}"
+
+Results ({len(results)} rows):
+{str(self._preview(results))}
 
 Provide a clear summary:"""
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=250
-            )
-            
-            explanation = response.choices[0].message.content.strip()
-            logger.info("Generated results explanation")
-            return explanation
-            
-        except Exception as e:
-            logger.error(f"Results explanation failed: {str(e)}")
-            return f"Found {row_count} result(s) matching your query."
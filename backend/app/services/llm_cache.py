@@ -0,0 +1,262 @@
+"""LLM Cache - Exact-match cache for deterministic LLM completions"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Iterator, AsyncIterator
+import logging
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+class LLMCache:
+    """Caches LLM responses keyed by sha256(model + prompt)
+    
+    Entries are held in an in-process LRU and, when a path is given,
+    persisted to a small SQLite table so they survive restarts. Entries
+    expire after ttl_seconds and the table keeps at most max_persisted rows.
+    """
+    
+    # Only near-deterministic completions are safe to replay
+    MAX_CACHEABLE_TEMPERATURE = 0.1
+    
+    # Expired and excess rows are pruned once every this many writes
+    PRUNE_EVERY = 100
+    
+    def __init__(self, db_path: Optional[str] = None, maxsize: int = 1024,
+                 ttl_seconds: int = 7 * 24 * 3600, max_persisted: int = 10000):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.max_persisted = max_persisted
+        self._entries = OrderedDict()  # key -> (created, response)
+        self._lock = threading.Lock()  # Guards _entries only; held briefly
+        self._db_lock = threading.Lock()  # Serializes use of the SQLite connection
+        self._conn = None
+        self._writes = 0
+        
+        if db_path:
+            try:
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._create_table()
+                self._prune()
+                logger.info(f"LLM cache persisted to {db_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache persistence disabled: {str(e)}")
+                self._conn = None
+    
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        """Build the cache key for a model/prompt pair"""
+        return hashlib.sha256(f"{model}\x00{prompt}".encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        cached = self._memory_get(key)
+        if cached is None and self._conn is not None:
+            cached = self._db_get(key)
+        return cached
+    
+    def set(self, key: str, response: str):
+        """Store a response under key"""
+        self._remember(key, response, time.time())
+        if self._conn is not None:
+            self._db_set(key, response)
+    
+    async def aget(self, key: str) -> Optional[str]:
+        """Async get(); SQLite reads run in a worker thread, off the event loop"""
+        cached = self._memory_get(key)
+        if cached is None and self._conn is not None:
+            cached = await anyio.to_thread.run_sync(self._db_get, key)
+        return cached
+    
+    async def aset(self, key: str, response: str):
+        """Async set(); the SQLite write and commit run in a worker thread"""
+        self._remember(key, response, time.time())
+        if self._conn is not None:
+            await anyio.to_thread.run_sync(self._db_set, key, response)
+    
+    def complete(self, client, model: str, prompt: str, temperature: float, max_tokens: int,
+                 store: bool = True, **options) -> str:
+        """Run a single-message chat completion, served from cache when possible
+        
+        Extra options (e.g. response_format) are passed through to the API.
+        With store=False a miss is not cached; callers that must check the
+        output first record it later with set().
+        
+        Returns:
+            Stripped response content
+        """
+        key = self._key(model, prompt, temperature)
+        cached = self._log_hit(self.get(key)) if key else None
+        if cached is not None:
+            return cached
+        
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **options
+        )
+        content = response.choices[0].message.content.strip()
+        if key and store:
+            self.set(key, content)
+        return content
+    
+    async def acomplete(self, client, model: str, prompt: str, temperature: float, max_tokens: int, **options) -> str:
+        """Async variant of complete() for AsyncGroq clients"""
+        key = self._key(model, prompt, temperature)
+        cached = self._log_hit(await self.aget(key)) if key else None
+        if cached is not None:
+            return cached
+        
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **options
+        )
+        content = response.choices[0].message.content.strip()
+        if key:
+            await self.aset(key, content)
+        return content
+    
+    def stream(self, client, model: str, prompt: str, temperature: float, max_tokens: int,
+               store: bool = True) -> Iterator[str]:
+        """Stream completion deltas; a cache hit is yielded as a single chunk"""
+        key = self._key(model, prompt, temperature)
+        cached = self._log_hit(self.get(key)) if key else None
+        if cached is not None:
+            yield cached
+            return
+        
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        parts = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        if key and store:
+            self.set(key, "".join(parts).strip())
+    
+    async def astream(self, client, model: str, prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        """Async variant of stream() for AsyncGroq clients"""
+        key = self._key(model, prompt, temperature)
+        cached = self._log_hit(await self.aget(key)) if key else None
+        if cached is not None:
+            yield cached
+            return
+        
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        if key:
+            await self.aset(key, "".join(parts).strip())
+    
+    def _key(self, model: str, prompt: str, temperature: float) -> Optional[str]:
+        """Return the cache key, or None when the call is not cacheable"""
+        if temperature > self.MAX_CACHEABLE_TEMPERATURE:
+            return None
+        return self.make_key(model, prompt)
+    
+    def _log_hit(self, cached: Optional[str]) -> Optional[str]:
+        """Pass a lookup result through, logging hits"""
+        if cached is not None:
+            logger.info("LLM cache hit")
+        return cached
+    
+    def _expired(self, created: float) -> bool:
+        """Check whether an entry created at this time is past its TTL"""
+        return time.time() - created > self.ttl_seconds
+    
+    def _memory_get(self, key: str) -> Optional[str]:
+        """Look up the in-memory LRU, dropping an expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def _remember(self, key: str, response: str, created: float):
+        """Insert into the in-memory LRU, evicting the oldest entry if full"""
+        with self._lock:
+            self._entries[key] = (created, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def _create_table(self):
+        """Create the persisted table, replacing one from before entries expired"""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")]
+        if columns and "created" not in columns:
+            self._conn.execute("DROP TABLE llm_cache")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache(key TEXT PRIMARY KEY, resp TEXT, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache(created)")
+        self._conn.commit()
+    
+    def _db_get(self, key: str) -> Optional[str]:
+        """Read a live entry from SQLite and promote it into memory"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT resp, created FROM llm_cache WHERE key = ? AND created >= ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        
+        self._remember(key, row[0], row[1])
+        return row[0]
+    
+    def _db_set(self, key: str, response: str):
+        """Persist an entry, pruning the table every PRUNE_EVERY writes"""
+        with self._db_lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache(key, resp, created) VALUES (?, ?, ?)",
+                    (key, response, time.time())
+                )
+                self._conn.commit()
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    self._prune()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {str(e)}")
+    
+    def _prune(self):
+        """Delete expired rows and all but the newest max_persisted rows"""
+        self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_persisted,)
+        )
+        self._conn.commit()
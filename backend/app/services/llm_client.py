@@ -0,0 +1,29 @@
+"""LLM Client - Shared Groq clients over pooled HTTP/2 connections"""
+
+import os
+import httpx
+from groq import Groq, AsyncGroq
+
+# One keep-alive pool per client, shared by every service that calls Groq
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+HTTP_TIMEOUT = 30.0
+
+def _get_api_key() -> str:
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("GROQ_API_KEY environment variable not set")
+    return api_key
+
+def create_groq_client() -> Groq:
+    """Create a sync Groq client multiplexing requests over HTTP/2"""
+    return Groq(
+        api_key=_get_api_key(),
+        http_client=httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
+
+def create_async_groq_client() -> AsyncGroq:
+    """Create an async Groq client multiplexing requests over HTTP/2"""
+    return AsyncGroq(
+        api_key=_get_api_key(),
+        http_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
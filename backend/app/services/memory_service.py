@@ -1,6 +1,8 @@
 """Memory Service - Manages conversation context"""
 
 import uuid
+import threading
+from collections import deque
 from typing import List, Dict, Any
 from datetime import datetime
 import logging
@@ -10,39 +12,50 @@ logger = logging.getLogger(__name__)
 class MemoryService:
     """Manages conversation history and context"""
     
+    # Interactions kept per session; older ones are dropped
+    MAX_INTERACTIONS = 20
+    
     def __init__(self):
         self.sessions = {}  # In-memory storage (use Redis/DB for production)
+        self._lock = threading.Lock()  # Routes run concurrently in the threadpool
     
     def create_session(self) -> str:
         """Create a new session"""
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = {
-            "created_at": datetime.now(),
-            "interactions": []
-        }
+        with self._lock:
+            self.sessions[session_id] = self._new_session()
         logger.info(f"Created session: {session_id}")
         return session_id
     
-    def add_interaction(self, session_id: str, question: str, sql: str, results: List[Dict[str, Any]]):
-        """Add interaction to session history"""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {
-                "created_at": datetime.now(),
-                "interactions": []
-            }
+    def add_interaction(self, session_id: str, question: str, sql: str):
+        """Add interaction to session history
         
-        self.sessions[session_id]["interactions"].append({
-            "timestamp": datetime.now(),
-            "question": question,
-            "sql": sql,
-            "results": results
-        })
+        Only the question and SQL are kept; result rows are never read
+        back as context and would pin large payloads in memory.
+        """
+        with self._lock:
+            if session_id not in self.sessions:
+                self.sessions[session_id] = self._new_session()
+            
+            self.sessions[session_id]["interactions"].append({
+                "timestamp": datetime.now().isoformat(),
+                "question": question,
+                "sql": sql
+            })
         
         logger.info(f"Added interaction to session {session_id}")
     
     def get_context(self, session_id: str) -> List[Dict[str, Any]]:
         """Get conversation context for a session"""
-        if session_id not in self.sessions:
-            return []
-        
-        return self.sessions[session_id]["interactions"]
+        with self._lock:
+            if session_id not in self.sessions:
+                return []
+            
+            return list(self.sessions[session_id]["interactions"])
+    
+    def _new_session(self) -> Dict[str, Any]:
+        """Create an empty session record"""
+        return {
+            "created_at": datetime.now().isoformat(),
+            "interactions": deque(maxlen=self.MAX_INTERACTIONS)
+        }
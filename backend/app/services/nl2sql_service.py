@@ -1,25 +1,113 @@
 """NL2SQL Service - Converts natural language to SQL using Groq API"""
 
-import os
-import json
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator
 import logging
 from groq import Groq
 
+from app.services.llm_cache import LLMCache
+from app.services.llm_client import create_groq_client
+from app.services.schema_service import SchemaService
+from app.services.semantic_cache import SemanticCache
+
 logger = logging.getLogger(__name__)
 
+# Markdown fences and line comments stripped from model output in one pass
+_CLEAN_RE = re.compile(r'```sql\s*|```\s*|--.*$', re.MULTILINE)
+
 class NL2SQLService:
-    def __init__(self):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY environment variable not set")
-        self.client = Groq(api_key=api_key)
-        self.model = "mixtral-8x7b-32768"  # Using Mixtral for better SQL generation
+    def __init__(self, client: Optional[Groq] = None, cache: Optional[LLMCache] = None, semantic_cache: Optional[SemanticCache] = None):
+        self.client = client or create_groq_client()
+        self.gen_model = "llama-3.3-70b-versatile"  # Larger model for SQL generation
+        self.fix_model = "llama-3.1-8b-instant"  # Fast model for error-guided fixes
+        self.cache = cache or LLMCache()
+        self.semantic_cache = semantic_cache
     
     def generate_sql(self, question: str, schema: Dict[str, Any], context: List[Dict] = None) -> str:
         """Generate SQL from natural language question"""
         
+        cached_sql = self._semantic_lookup(question, schema, context)
+        if cached_sql:
+            return cached_sql
+        
+        prompt = self._build_prompt(question, schema, context)
+        
+        try:
+            # Prompt embeds schema and context, so identical requests share a key
+            sql = self.cache.complete(
+                self.client,
+                model=self.gen_model,
+                prompt=prompt,
+                temperature=0.1,  # Low temperature for consistent SQL
+                max_tokens=500,
+                store=False  # Cached by remember_sql once it has executed
+            )
+            
+            # Clean up the SQL
+            sql = self._clean_sql(sql)
+            
+            logger.info(f"Generated SQL: {sql}")
+            return sql
+            
+        except Exception as e:
+            logger.error(f"SQL generation failed: {str(e)}")
+            raise Exception(f"Failed to generate SQL: {str(e)}")
+    
+    def stream_sql(self, question: str, schema: Dict[str, Any], context: List[Dict] = None) -> Iterator[Dict[str, str]]:
+        """Generate SQL while streaming model output
+        
+        Yields:
+            {"token": ...} for each raw model delta, then {"sql": ...} with the cleaned query
+        """
+        cached_sql = self._semantic_lookup(question, schema, context)
+        if cached_sql:
+            yield {"sql": cached_sql}
+            return
+        
+        prompt = self._build_prompt(question, schema, context)
+        
+        parts = []
+        try:
+            for delta in self.cache.stream(
+                self.client,
+                model=self.gen_model,
+                prompt=prompt,
+                temperature=0.1,
+                max_tokens=500,
+                store=False
+            ):
+                parts.append(delta)
+                yield {"token": delta}
+        except Exception as e:
+            logger.error(f"SQL generation failed: {str(e)}")
+            raise Exception(f"Failed to generate SQL: {str(e)}")
+        
+        sql = self._clean_sql("".join(parts).strip())
+        
+        logger.info(f"Generated SQL: {sql}")
+        yield {"sql": sql}
+    
+    def remember_sql(self, question: str, schema: Dict[str, Any], context: Optional[List[Dict]], sql: str):
+        """Cache SQL for this question once it has validated and executed successfully"""
+        prompt = self._build_prompt(question, schema, context)
+        self.cache.set(self.cache.make_key(self.gen_model, prompt), sql)
+        if self._semantic_eligible(context):
+            self.semantic_cache.store(question, SchemaService.schema_hash(schema), sql)
+    
+    def _semantic_lookup(self, question: str, schema: Dict[str, Any], context: Optional[List[Dict]]) -> Optional[str]:
+        """Return cached SQL for a similar earlier question, if any"""
+        if not self._semantic_eligible(context):
+            return None
+        
+        return self.semantic_cache.lookup(question, SchemaService.schema_hash(schema))
+    
+    def _semantic_eligible(self, context: Optional[List[Dict]]) -> bool:
+        """Follow-up questions depend on context, so only standalone ones are cached"""
+        return bool(self.semantic_cache and self.semantic_cache.enabled) and not context
+    
+    def _build_prompt(self, question: str, schema: Dict[str, Any], context: Optional[List[Dict]]) -> str:
+        """Build the SQL generation prompt"""
+        
         # Build context from conversation history
         context_str = ""
         if context:
@@ -28,11 +116,10 @@ class NL2SQLService:
                 context_str += f"Q{i+1}: {interaction['question']}\n"
                 context_str += f"SQL{i+1}: {interaction['sql']}\n"
         
-        # Create prompt
-        prompt = f"""You are a SQL expert. Convert the natural language question to a valid SQL query.
+        return f"""You are a SQL expert. Convert the natural language question to a valid SQL query.
 
 Database Schema:
-{json.dumps(schema, indent=2)}
+{SchemaService.render_compact(schema, question)}
 {context_str}
 
 Rules:
@@ -47,26 +134,6 @@ Rules:
 Question: {question}
 
 SQL Query:"""
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,  # Low temperature for consistent SQL
-                max_tokens=500
-            )
-            
-            sql = response.choices[0].message.content.strip()
-            
-            # Clean up the SQL
-            sql = self._clean_sql(sql)
-            
-            logger.info(f"Generated SQL: {sql}")
-            return sql
-            
-        except Exception as e:
-            logger.error(f"SQL generation failed: {str(e)}")
-            raise Exception(f"Failed to generate SQL: {str(e)}")
     
     def fix_sql(self, original_sql: str, error: str, schema: Dict[str, Any]) -> str:
         """Auto-recovery: Fix SQL based on error message"""
@@ -74,7 +141,7 @@ SQL Query:"""
         prompt = f"""You are a SQL debugging expert. The following SQL query failed with an error.
 
 Database Schema:
-{json.dumps(schema, indent=2)}
+{SchemaService.render_compact(schema)}
 
 Original SQL:
 {original_sql}
@@ -88,14 +155,14 @@ Return ONLY the corrected SQL query, no explanations or markdown.
 Corrected SQL Query:"""
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+            corrected_sql = self.cache.complete(
+                self.client,
+                model=self.fix_model,
+                prompt=prompt,
                 temperature=0.1,
-                max_tokens=500
+                max_tokens=500,
+                store=False
             )
-            
-            corrected_sql = response.choices[0].message.content.strip()
             corrected_sql = self._clean_sql(corrected_sql)
             
             logger.info(f"Corrected SQL: {corrected_sql}")
@@ -107,12 +174,8 @@ Corrected SQL Query:"""
     
     def _clean_sql(self, sql: str) -> str:
         """Clean up SQL query"""
-        # Remove markdown code blocks
-        sql = re.sub(r'```sql\s*', '', sql)
-        sql = re.sub(r'```\s*', '', sql)
-        
-        # Remove comments
-        sql = re.sub(r'--.*$', '', sql, flags=re.MULTILINE)
+        # Remove markdown code blocks and comments
+        sql = _CLEAN_RE.sub('', sql)
         
         # Remove extra whitespace
         sql = ' '.join(sql.split())
@@ -1,18 +1,20 @@
 """Query Executor - Executes SQL with timeout and safety"""
 
 import sqlite3
-import signal
+import time
 from typing import List, Dict, Any
 import logging
 
-logger = logging.getLogger(__name__)
+from app.db.database import get_connection
 
-class TimeoutError(Exception):
-    pass
+logger = logging.getLogger(__name__)
 
 class QueryExecutor:
     """Executes SQL queries safely"""
     
+    # SQLite VM instructions between deadline checks
+    PROGRESS_INTERVAL = 1000
+    
     def __init__(self, timeout_seconds: int = 30):
         self.timeout = timeout_seconds
     
@@ -26,28 +28,37 @@ class QueryExecutor:
         Returns:
             List of dictionaries with results
         """
+        conn = get_connection(db_path)
+        
+        # Abort the statement once the deadline passes; a non-zero return
+        # from the handler makes SQLite raise OperationalError("interrupted")
+        deadline = time.monotonic() + self.timeout
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, self.PROGRESS_INTERVAL)
+        
         try:
-            conn = sqlite3.connect(db_path, timeout=self.timeout)
-            conn.row_factory = sqlite3.Row  # Enable column name access
             cursor = conn.cursor()
             
             logger.info(f"Executing: {sql}")
             cursor.execute(sql)
             
-            # Fetch all results
-            rows = cursor.fetchall()
-            
-            # Convert to list of dicts
-            results = [dict(row) for row in rows]
+            # Convert plain tuples to dicts, sharing one list of column names
+            columns = [col[0] for col in cursor.description or ()]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
             
-            conn.close()
+            cursor.close()
             
             logger.info(f"Query returned {len(results)} rows")
             return results
             
         except sqlite3.OperationalError as e:
+            if str(e) == "interrupted":
+                logger.error(f"Query timed out after {self.timeout}s")
+                raise Exception(f"Query timed out after {self.timeout} seconds")
+            
             logger.error(f"SQL execution error: {str(e)}")
             raise Exception(f"Query execution failed: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}")
             raise Exception(f"Failed to execute query: {str(e)}")
+        finally:
+            conn.set_progress_handler(None, 0)
@@ -1,57 +1,145 @@
 """Schema Service - Extracts database schema for AI context"""
 
-import sqlite3
-from typing import Dict, List, Any
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Set
 import logging
+import orjson
+
+from app.db.database import get_connection
 
 logger = logging.getLogger(__name__)
 
+# Values derived from a schema (hash, rendered lines), keyed by schema identity
+_derived = OrderedDict()
+_derived_lock = threading.Lock()
+
+@lru_cache(maxsize=32)
+def _get_schema_cached(db_path: str, mtime: float) -> Dict[str, Any]:
+    """Read the schema once per (db_path, mtime); writes bump mtime and invalidate"""
+    cursor = get_connection(db_path).cursor()
+    
+    # All columns of all tables in one query (pragma_table_info, SQLite 3.16+)
+    cursor.execute(
+        """SELECT m.name, p.name, p.type, p."notnull", p.pk
+        FROM sqlite_master AS m
+        JOIN pragma_table_info(m.name) AS p
+        WHERE m.type = 'table'
+        ORDER BY m.name, p.cid"""
+    )
+    
+    schema = {}
+    
+    for table, name, col_type, notnull, pk in cursor.fetchall():
+        table_info = schema.setdefault(table, {"columns": []})
+        table_info["columns"].append({
+            "name": name,
+            "type": col_type,
+            "nullable": not notnull,
+            "primary_key": bool(pk)
+        })
+    
+    cursor.close()
+    
+    logger.info(f"Extracted schema for {len(schema)} tables")
+    return schema
+
+def _tokenize(text: str) -> Set[str]:
+    """Lowercase word tokens with a naive plural strip ("orders" -> "order")"""
+    words = re.findall(r'[a-z0-9]+', text.lower())
+    return {w[:-1] if len(w) > 3 and w.endswith('s') else w for w in words}
+
+def _render_table(table: str, info: Dict[str, Any]) -> str:
+    """Render one table as name(col PK, col, ...)"""
+    columns = ", ".join(
+        f"{col['name']} PK" if col["primary_key"] else col["name"]
+        for col in info["columns"]
+    )
+    return f"{table}({columns})"
+
+def _derive(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize/render a schema once and reuse the result on later requests
+    
+    Schemas come from _get_schema_cached, so the same object is returned
+    until the database changes. Entries keep a reference to the schema so
+    its id cannot be recycled while cached.
+    """
+    key = id(schema)
+    with _derived_lock:
+        entry = _derived.get(key)
+        if entry is not None and entry["schema"] is schema:
+            _derived.move_to_end(key)
+            return entry
+    
+    entry = {
+        "schema": schema,
+        "hash": hashlib.sha256(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS)).hexdigest(),
+        "lines": {table: _render_table(table, info) for table, info in schema.items()},
+        "tokens": {
+            table: _tokenize(" ".join([table] + [col["name"] for col in info["columns"]]))
+            for table, info in schema.items()
+        }
+    }
+    
+    with _derived_lock:
+        _derived[key] = entry
+        while len(_derived) > _get_schema_cached.cache_info().maxsize:
+            _derived.popitem(last=False)
+    return entry
+
+def _db_mtime(db_path: str) -> float:
+    """Latest modification time of the database, including its WAL file"""
+    mtime = os.path.getmtime(db_path)
+    wal_path = f"{db_path}-wal"
+    if os.path.exists(wal_path):
+        mtime = max(mtime, os.path.getmtime(wal_path))
+    return mtime
+
 class SchemaService:
     """Extracts and formats database schema"""
     
+    # Smaller schemas are always sent to the LLM in full
+    PRUNE_MIN_TABLES = 5
+    
     def get_schema(self, db_path: str) -> Dict[str, Any]:
         """Extract schema from SQLite database
         
+        Results are cached until the database file changes.
+        
         Returns:
             Dict with tables, columns, and relationships
         """
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Get all tables
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            schema = {}
-            
-            for table in tables:
-                # Get column info
-                cursor.execute(f"PRAGMA table_info({table})")
-                columns = []
-                for row in cursor.fetchall():
-                    col_info = {
-                        "name": row[1],
-                        "type": row[2],
-                        "nullable": not row[3],
-                        "primary_key": bool(row[5])
-                    }
-                    columns.append(col_info)
-                
-                # Get sample data (first 3 rows)
-                cursor.execute(f"SELECT * FROM {table} LIMIT 3")
-                sample_data = cursor.fetchall()
-                
-                schema[table] = {
-                    "columns": columns,
-                    "sample_count": len(sample_data)
-                }
-            
-            conn.close()
-            
-            logger.info(f"Extracted schema for {len(schema)} tables")
-            return schema
-            
+            return _get_schema_cached(db_path, _db_mtime(db_path))
+        
         except Exception as e:
             logger.error(f"Schema extraction failed: {str(e)}")
             raise Exception(f"Failed to extract schema: {str(e)}")
+    
+    @staticmethod
+    def schema_hash(schema: Dict[str, Any]) -> str:
+        """Stable hash identifying a database schema"""
+        return _derive(schema)["hash"]
+    
+    @staticmethod
+    def render_compact(schema: Dict[str, Any], question: Optional[str] = None) -> str:
+        """Render schema compactly, one line per table
+        
+        Example: "orders(id PK, user_id, total)". When a question is given and
+        the schema has at least PRUNE_MIN_TABLES tables, only tables whose name
+        or columns share a word with the question are kept (all tables if none
+        match).
+        """
+        derived = _derive(schema)
+        tables = list(schema)
+        
+        if question and len(tables) >= SchemaService.PRUNE_MIN_TABLES:
+            words = _tokenize(question)
+            relevant = [table for table in tables if words & derived["tokens"][table]]
+            tables = relevant or tables
+        
+        return "\n".join(derived["lines"][table] for table in tables)
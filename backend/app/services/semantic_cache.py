@@ -0,0 +1,107 @@
+"""Semantic Cache - Reuses SQL for near-duplicate questions"""
+
+import threading
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Optional dependency
+    np = None
+    SentenceTransformer = None
+
+class SemanticCache:
+    """Embedding-based cache mapping similar questions to generated SQL
+    
+    Entries are scoped by schema hash so a question asked against one
+    database never returns SQL written for another.
+    """
+    
+    MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.enabled = False
+        self._lock = threading.Lock()
+        
+        if SentenceTransformer is None:
+            logger.info("sentence-transformers not installed; semantic cache disabled")
+            return
+        
+        try:
+            self._model = SentenceTransformer(self.MODEL_NAME)
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled: {str(e)}")
+            return
+        
+        dim = self._model.get_sentence_embedding_dimension()
+        self._embeddings = np.zeros((max_entries, dim), dtype=np.float32)
+        self._schema_ids = np.full(max_entries, -1, dtype=np.int64)
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._sql = [None] * max_entries
+        self._schema_codes = {}
+        self._size = 0
+        self._clock = 0
+        self.enabled = True
+        logger.info(f"Semantic cache enabled ({self.MODEL_NAME})")
+    
+    def lookup(self, question: str, schema_hash: str) -> Optional[str]:
+        """Return cached SQL for a similar question on the same schema"""
+        if not self.enabled:
+            return None
+        
+        query = self._embed(question)
+        
+        with self._lock:
+            code = self._schema_codes.get(schema_hash)
+            if code is None or self._size == 0:
+                return None
+            
+            sims = self._embeddings[:self._size] @ query
+            sims[self._schema_ids[:self._size] != code] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] <= self.threshold:
+                return None
+            
+            self._clock += 1
+            self._last_used[best] = self._clock
+            logger.info(f"Semantic cache hit (similarity {sims[best]:.3f})")
+            return self._sql[best]
+    
+    def store(self, question: str, schema_hash: str, sql: str):
+        """Cache SQL for a question, replacing the entry of a near-duplicate question"""
+        if not self.enabled:
+            return
+        
+        embedding = self._embed(question)
+        
+        with self._lock:
+            code = self._schema_codes.setdefault(schema_hash, len(self._schema_codes))
+            
+            sims = self._embeddings[:self._size] @ embedding
+            sims[self._schema_ids[:self._size] != code] = -1.0
+            best = int(np.argmax(sims)) if self._size else -1
+            
+            if best >= 0 and sims[best] > self.threshold:
+                # Same question as an existing entry (a hit, or its corrected SQL)
+                slot = best
+            elif self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Evict the least recently used entry
+                slot = int(np.argmin(self._last_used))
+            
+            self._clock += 1
+            self._embeddings[slot] = embedding
+            self._schema_ids[slot] = code
+            self._last_used[slot] = self._clock
+            self._sql[slot] = sql
+    
+    def _embed(self, text: str):
+        """Encode text as a unit-length vector so dot product is cosine similarity"""
+        return self._model.encode(text, normalize_embeddings=True).astype(np.float32)
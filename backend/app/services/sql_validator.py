@@ -1,34 +1,40 @@
 """SQL Validator - Security layer to prevent unsafe SQL operations"""
 
-import re
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Optional
 import logging
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
 
 logger = logging.getLogger(__name__)
 
 class SQLValidator:
     """Validates SQL queries for security and safety"""
     
-    # Dangerous keywords that should be blocked
-    BLOCKED_KEYWORDS = [
-        'DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE',
-        'TRUNCATE', 'REPLACE', 'MERGE', 'GRANT', 'REVOKE',
-        'EXEC', 'EXECUTE', 'PRAGMA', 'ATTACH', 'DETACH'
-    ]
+    # Statement nodes that must not appear anywhere in the parsed query
+    BLOCKED_NODES = (
+        exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Drop,
+        exp.Alter, exp.Create, exp.TruncateTable, exp.Pragma, exp.Command
+    )
     
     # Maximum number of rows to return
     MAX_ROWS = 1000
     
-    def validate(self, sql: str) -> Dict[str, any]:
+    def validate(self, sql: str, limit: Optional[int] = None) -> Dict[str, any]:
         """Validate SQL query for security and safety
         
+        The query is parsed into an AST, so keywords inside string literals
+        or comments cannot cause false positives or slip past the checks.
+        
+        Args:
+            sql: SQL query to validate
+            limit: Optional client row cap; any larger LIMIT in the query is lowered to it
+            
         Returns:
-            Dict with 'valid' (bool) and 'error' (str) keys
+            Dict with 'valid' (bool) and 'error' (str) keys; valid results
+            carry the normalized 'sql' (with LIMIT enforced)
         """
         try:
-            # Remove extra whitespace
-            sql = ' '.join(sql.split())
-            
             # Check if SQL is empty
             if not sql.strip():
                 return {
@@ -36,48 +42,60 @@ class SQLValidator:
                     "error": "Empty SQL query"
                 }
             
-            # Check for blocked keywords
-            sql_upper = sql.upper()
-            for keyword in self.BLOCKED_KEYWORDS:
-                if re.search(r'\b' + keyword + r'\b', sql_upper):
-                    logger.warning(f"Blocked keyword detected: {keyword}")
-                    return {
-                        "valid": False,
-                        "error": f"Blocked operation: {keyword} is not allowed. Only SELECT queries are permitted."
-                    }
+            try:
+                statements = [s for s in sqlglot.parse(sql, read="sqlite") if s is not None]
+            except ParseError as e:
+                return {
+                    "valid": False,
+                    "error": f"Could not parse SQL: {str(e)}"
+                }
             
-            # Ensure it's a SELECT query
-            if not sql_upper.strip().startswith('SELECT'):
+            # Check for semicolon-based multi-statement attempts
+            if len(statements) > 1:
                 return {
                     "valid": False,
-                    "error": "Only SELECT queries are allowed"
+                    "error": "Multiple SQL statements not allowed"
                 }
             
-            # Check for comment-based injection attempts
-            if '--' in sql or '/*' in sql or '*/' in sql:
-                logger.warning("SQL comment detected")
+            if not statements:
                 return {
                     "valid": False,
-                    "error": "SQL comments are not allowed"
+                    "error": "Empty SQL query"
                 }
             
-            # Check for semicolon-based multi-statement attempts
-            if sql.count(';') > 1:
+            tree = statements[0]
+            
+            # Check for blocked operations anywhere in the tree
+            blocked = tree if isinstance(tree, self.BLOCKED_NODES) else tree.find(*self.BLOCKED_NODES)
+            if blocked is not None:
+                # Unparsed statements (e.g. REPLACE INTO) are kept as Commands
+                operation = (blocked.name if isinstance(blocked, exp.Command) else blocked.key).upper()
+                logger.warning(f"Blocked operation detected: {operation}")
                 return {
                     "valid": False,
-                    "error": "Multiple SQL statements not allowed"
+                    "error": f"Blocked operation: {operation} is not allowed. Only SELECT queries are permitted."
+                }
+            
+            # Ensure it's a SELECT query (including UNION/WITH forms)
+            if not isinstance(tree, exp.Query):
+                return {
+                    "valid": False,
+                    "error": "Only SELECT queries are allowed"
                 }
             
             # Add LIMIT if not present (safety measure)
-            if 'LIMIT' not in sql_upper:
-                sql = sql.rstrip(';')
-                sql = f"{sql} LIMIT {self.MAX_ROWS};"
-                logger.info(f"Added LIMIT clause: LIMIT {self.MAX_ROWS}")
+            if tree.args.get("limit") is None:
+                max_rows = min(limit or self.MAX_ROWS, self.MAX_ROWS)
+                tree = tree.limit(max_rows)
+                logger.info(f"Added LIMIT clause: LIMIT {max_rows}")
+            elif limit is not None and not self._limit_within(tree, limit):
+                tree = tree.limit(limit)
+                logger.info(f"Lowered LIMIT clause to {limit}")
             
             logger.info("SQL validation passed")
             return {
                 "valid": True,
-                "sql": sql
+                "sql": tree.sql(dialect="sqlite", comments=False) + ";"
             }
             
         except Exception as e:
@@ -87,6 +105,11 @@ class SQLValidator:
                 "error": f"Validation failed: {str(e)}"
             }
     
+    def _limit_within(self, tree: exp.Expression, limit: int) -> bool:
+        """Check whether the query's own LIMIT is a literal no larger than limit"""
+        value = tree.args["limit"].expression
+        return isinstance(value, exp.Literal) and value.is_int and int(value.this) <= limit
+    
     def sanitize_input(self, value: str) -> str:
         """Sanitize user input to prevent injection
         
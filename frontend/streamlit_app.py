@@ -4,9 +4,15 @@ Professional dashboard UI for Natural Language to SQL
 
 import streamlit as st
 import requests
-import pandas as pd
+import ijson
+import orjson
+import pyarrow as pa
 import os
-from typing import Dict, Any
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Page config
 st.set_page_config(
@@ -16,8 +22,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS injected at the top of the page
+_CSS = """
 <style>
 .main-header {
     font-size: 2.5rem;
@@ -39,16 +45,278 @@ st.markdown("""
     margin: 0.5rem 0;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# About section shown in the sidebar
+_ABOUT_MD = """
+    **OpenNL2SQL** converts your questions into SQL queries using AI.
+    
+    **Features:**
+    - 🧠 AI-powered query generation
+    - 🛡️ SQL injection protection
+    - 🔄 Auto-recovery system
+    - 💬 Context-aware conversations
+    """
+
+# Page footer
+_FOOTER_HTML = """
+<div style='text-align: center; color: #666; padding: 1rem;'>
+    <p>Made with ❤️ using <b>FastAPI</b>, <b>Streamlit</b> & <b>Groq</b></p>
+    <p>🔒 All queries are validated for security | 🚀 Auto-recovery enabled</p>
+</div>
+"""
+
+# Custom CSS
+st.markdown(_CSS, unsafe_allow_html=True)
 
 # Backend API URL
 BACKEND_URL = os.getenv("BACKEND_URL", "https://amalsp-opennl2sql-api.hf.space")
 
+@st.cache_resource
+def get_http() -> requests.Session:
+    """Shared HTTP session so reruns reuse pooled keep-alive connections"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        # No connect retries, so a dead backend fails within the connect timeout
+        max_retries=Retry(total=2, connect=0, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive", "Accept-Encoding": "gzip, br"})
+    return session
+
+# Default number of past queries kept in the History tab
+HISTORY_LIMIT = 50
+
+# (connect, read) timeouts in seconds; a dead backend fails within the connect timeout
+QUERY_TIMEOUT = (3.05, 30)
+PING_TIMEOUT = (2, 5)
+
+# Larger results are offered as an Arrow download with a short preview grid
+LARGE_RESULT_ROWS = 500
+PREVIEW_ROWS = 100
+
+# Bodies below this size are cheaper to decode in one go than to stream
+STREAM_MIN_BYTES = 16 * 1024
+
+# ijson events that carry a complete top-level value
+SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+def parse_query_stream(raw, max_rows: int) -> Dict[str, Any]:
+    """Decode a /query body in one pass, keeping at most max_rows result rows"""
+    data = {"results": []}
+    rows = data["results"]
+    builder = None
+    
+    for prefix, event, value in ijson.parse(raw, use_float=True):
+        if prefix.startswith("results.item"):
+            if prefix == "results.item" and event == "start_map":
+                builder = ijson.ObjectBuilder() if len(rows) < max_rows else None
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == "results.item" and event == "end_map":
+                    rows.append(builder.value)
+                    builder = None
+        elif prefix and "." not in prefix and event in SCALAR_EVENTS:
+            data[prefix] = value
+    
+    return data
+
+def fetch_query(payload: Dict[str, Any], max_rows: int):
+    """POST /query, returning (status_code, data) with results capped at max_rows"""
+    with get_http().post(f"{BACKEND_URL}/query", json=payload, stream=True, timeout=QUERY_TIMEOUT) as response:
+        if response.status_code != 200:
+            return response.status_code, None
+        
+        length = response.headers.get("Content-Length")
+        if length is not None and int(length) < STREAM_MIN_BYTES:
+            data = orjson.loads(response.content)
+        else:
+            # Let urllib3 undo gzip/br so ijson reads plain JSON from the socket
+            response.raw.decode_content = True
+            data = parse_query_stream(response.raw, max_rows)
+        
+        data["content_encoding"] = response.headers.get("Content-Encoding", "identity")
+        return response.status_code, data
+
+def fetch_answer(question: str, session_id: Optional[str], max_rows: int) -> Dict[str, Any]:
+    """Fetch a successful /query response, raising on any failure"""
+    status_code, data = fetch_query(
+        {"question": question, "session_id": session_id, "limit": max_rows},
+        max_rows=max_rows
+    )
+    if status_code != 200:
+        raise Exception(f"API Error: {status_code}")
+    
+    # Raise failures instead of returning them so they are never cached
+    if not data["success"]:
+        raise Exception(data["error"])
+    return data
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def run_query(question: str, session_id: str, max_rows: int) -> Dict[str, Any]:
+    """Fetch a /query response; repeated questions within a session are served from memory
+    
+    st.cache_data is shared by every user of the server process, so only
+    call this with an existing session_id; a cached answer for a new
+    session would hand its backend session to whoever asks next.
+    """
+    return fetch_answer(question, session_id, max_rows)
+
+def ask_backend(question: str, session_id: Optional[str]) -> Dict[str, Any]:
+    """Answer a question, serving repeats within an existing session from the response cache"""
+    max_rows = st.session_state.get("max_rows", 100)
+    
+    if session_id is None:
+        data = fetch_answer(question, session_id, max_rows)
+    else:
+        if st.session_state.get("bypass_cache"):
+            run_query.clear()
+        data = run_query(question, session_id, max_rows)
+    
+    st.session_state.last_encoding = data["content_encoding"]
+    return data
+
+def results_table(rows: List[Dict[str, Any]]) -> pa.Table:
+    """Build the Arrow table handed to st.dataframe"""
+    try:
+        return pa.Table.from_pylist(rows)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite columns may mix types Arrow cannot unify; show those as text
+        return pa.Table.from_pylist([
+            {key: None if value is None else str(value) for key, value in row.items()}
+            for row in rows
+        ])
+
+def arrow_ipc_bytes(table: pa.Table) -> bytes:
+    """Serialize a table to the Arrow IPC stream format"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def record_query_result(data: Dict[str, Any]):
+    """Record a successful /query response in the session and history"""
+    st.session_state.session_id = data["session_id"]
+    st.session_state.history.append(data)
+    # Kept so reruns (e.g. the download button) render the result again
+    st.session_state.last_result = data
+
+def show_query_result(data: Dict[str, Any]):
+    """Render a successful /query response"""
+    # Success message
+    st.success("✅ Query executed successfully!")
+    
+    # Results display
+    col_sql, col_explain = st.columns(2)
+    
+    with col_sql:
+        with st.expander("📝 Generated SQL", expanded=True):
+            st.code(data["sql"], language="sql")
+    
+    with col_explain:
+        with st.expander("💡 SQL Explanation", expanded=True):
+            st.info(data["sql_explanation"])
+    
+    # Results
+    st.subheader("📊 Query Results")
+    
+    table = results_table(data["results"] or [])
+    n_rows, n_cols = table.shape
+    
+    if n_rows:
+        # Metrics
+        rows_col, cols_col, _ = st.columns(3)
+        rows_col.metric("Rows Returned", n_rows)
+        cols_col.metric("Columns", n_cols)
+        
+        # Table; large results keep the interactive grid small
+        if n_rows > LARGE_RESULT_ROWS:
+            st.download_button(
+                "⬇️ Download results (Arrow)",
+                arrow_ipc_bytes(table),
+                file_name="results.arrow",
+                mime="application/vnd.apache.arrow.stream"
+            )
+            st.caption(f"Showing the first {PREVIEW_ROWS} of {n_rows} rows")
+            table = table.slice(0, PREVIEW_ROWS)
+        
+        st.dataframe(
+            table,
+            use_container_width=True,
+            height=400
+        )
+        
+        # Results explanation
+        with st.expander("💬 Results Summary"):
+            st.success(data["results_explanation"])
+    else:
+        st.warning("No results found.")
+
+@st.fragment
+def show_examples():
+    """Example questions, shown while the checkbox is ticked"""
+    if st.checkbox("💡 Example Questions", key="show_examples"):
+        with st.expander("Example Questions", expanded=True):
+            st.markdown("""
+            **Aggregations:**
+            - How many orders were placed last month?
+            - What is the total revenue this year?
+            
+            **Top N Queries:**
+            - Show me the top 10 customers by spending
+            - Which products have the highest ratings?
+            
+            **Filters:**
+            - List all orders over $1000
+            - Show me customers from California
+            
+            **Joins:**
+            - Show me customer names with their order totals
+            - List products and their categories
+            """)
+
+@st.fragment
+def render_history():
+    """Query history list; as a fragment it can rerun without the rest of the page"""
+    if st.session_state.history:
+        history = st.session_state.history
+        for i, item in enumerate(reversed(history)):
+            sql = item.get('sql') or 'N/A'
+            with st.expander(f"Query #{len(history) - i}: {sql[:50]}..."):
+                st.markdown(f"**Question:** {item.get('question', 'N/A')}")
+                st.code(sql, language="sql")
+                st.caption(f"Session: {item.get('session_id', 'N/A')[:16]}...")
+    else:
+        st.info("📋 No queries yet. Ask a question to get started!")
+
+def resize_history():
+    """Rebuild the history with the new limit, keeping the newest entries"""
+    st.session_state.history = deque(st.session_state.history, maxlen=st.session_state.history_limit)
+
+def _ping_health(http: requests.Session):
+    """Open a pooled connection to the backend; failures are left to the real requests"""
+    try:
+        http.get(f"{BACKEND_URL}/health", timeout=PING_TIMEOUT)
+    except requests.exceptions.RequestException:
+        pass
+
+@st.cache_resource
+def _warmup() -> bool:
+    """Warm the connection pool (and a cold backend) once per server process"""
+    # Resolve the cached session here: the thread has no script run context
+    threading.Thread(target=_ping_health, args=(get_http(),), daemon=True).start()
+    return True
+
+_warmup()
+
 # Session state
 if 'session_id' not in st.session_state:
     st.session_state.session_id = None
 if 'history' not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=st.session_state.get("history_limit", HISTORY_LIMIT))
 
 # Header
 st.markdown('<div class="main-header">🚀 OpenNL2SQL</div>', unsafe_allow_html=True)
@@ -60,9 +328,11 @@ with st.sidebar:
     st.title("Controls")
     
     if st.button("\u267b\ufe0f New Session", use_container_width=True):
+        # Everything below reads the cleared state in this same run, so no rerun is needed
         st.session_state.session_id = None
-        st.session_state.history = []
-        st.rerun()
+        st.session_state.history.clear()
+        st.session_state.last_result = None
+        st.toast("Session reset")
     
     st.divider()
     
@@ -72,19 +342,13 @@ with st.sidebar:
         st.caption(f"ID: {st.session_state.session_id[:8]}...")
     else:
         st.info("No active session")
+    if st.session_state.get("last_encoding"):
+        st.caption(f"Last response encoding: {st.session_state.last_encoding}")
     
     st.divider()
     
     st.subheader("ℹ️ About")
-    st.markdown("""
-    **OpenNL2SQL** converts your questions into SQL queries using AI.
-    
-    **Features:**
-    - 🧠 AI-powered query generation
-    - 🛡️ SQL injection protection
-    - 🔄 Auto-recovery system
-    - 💬 Context-aware conversations
-    """)
+    st.markdown(_ABOUT_MD)
     
     st.divider()
     st.caption("Built with FastAPI, Streamlit & Groq")
@@ -105,99 +369,22 @@ with tab1:
         key="question_input"
     )
     
-    col1, col2, col3 = st.columns([2, 1, 1])
+    # Example questions sit in their own fragment below, so only the button needs a column
+    btn_col, _ = st.columns(2)
+    submit_btn = btn_col.button("🚀 Generate SQL & Execute", type="primary", use_container_width=True)
     
-    with col1:
-        submit_btn = st.button("🚀 Generate SQL & Execute", type="primary", use_container_width=True)
-    
-    with col2:
-        example_btn = st.button("💡 Example Questions", use_container_width=True)
-    
-    if example_btn:
-        with st.expander("Example Questions", expanded=True):
-            st.markdown("""
-            **Aggregations:**
-            - How many orders were placed last month?
-            - What is the total revenue this year?
-            
-            **Top N Queries:**
-            - Show me the top 10 customers by spending
-            - Which products have the highest ratings?
-            
-            **Filters:**
-            - List all orders over $1000
-            - Show me customers from California
-            
-            **Joins:**
-            - Show me customer names with their order totals
-            - List products and their categories
-            """)
+    # Toggling the checkbox reruns only this fragment, not the submit path
+    show_examples()
     
     if submit_btn and question:
+        st.session_state.last_result = None
         with st.spinner("🧠 AI is thinking..."):
             try:
-                # Make API request
-                response = requests.post(
-                    f"{BACKEND_URL}/query",
-                    json={
-                        "question": question,
-                        "session_id": st.session_state.session_id
-                    },
-                    timeout=30
-                )
+                data = ask_backend(question, st.session_state.session_id)
+                record_query_result(data)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if data["success"]:
-                        # Update session
-                        st.session_state.session_id = data["session_id"]
-                        st.session_state.history.append(data)
-                        
-                        # Success message
-                        st.success("✅ Query executed successfully!")
-                        
-                        # Results display
-                        col_sql, col_explain = st.columns(2)
-                        
-                        with col_sql:
-                            with st.expander("📝 Generated SQL", expanded=True):
-                                st.code(data["sql"], language="sql")
-                        
-                        with col_explain:
-                            with st.expander("💡 SQL Explanation", expanded=True):
-                                st.info(data["sql_explanation"])
-                        
-                        # Results
-                        st.subheader("📊 Query Results")
-                        
-                        if data["results"]:
-                            df = pd.DataFrame(data["results"])
-                            
-                            # Metrics
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.metric("Rows Returned", len(df))
-                            with col2:
-                                st.metric("Columns", len(df.columns))
-                            
-                            # Table
-                            st.dataframe(
-                                df,
-                                use_container_width=True,
-                                height=400
-                            )
-                            
-                            # Results explanation
-                            with st.expander("💬 Results Summary"):
-                                st.success(data["results_explanation"])
-                        else:
-                            st.warning("No results found.")
-                    else:
-                        st.error(f"❌ Error: {data['error']}")
-                else:
-                    st.error(f"❌ API Error: {response.status_code}")
-                    
+            except requests.exceptions.ConnectTimeout:
+                st.error("❌ Backend unreachable — check URL")
             except requests.exceptions.ConnectionError:
                 st.error("❌ Cannot connect to backend. Make sure the FastAPI server is running on http://localhost:8000")
             except Exception as e:
@@ -205,18 +392,13 @@ with tab1:
     
     elif submit_btn:
         st.warning("⚠️ Please enter a question first.")
+    
+    if st.session_state.get("last_result"):
+        show_query_result(st.session_state.last_result)
 
 with tab2:
     st.subheader("📊 Query History")
-    
-    if st.session_state.history:
-        for idx, item in enumerate(reversed(st.session_state.history), 1):
-            with st.expander(f"Query #{len(st.session_state.history) - idx + 1}: {item.get('sql', 'N/A')[:50]}..."):
-                st.markdown(f"**Question:** {item.get('question', 'N/A')}")
-                st.code(item.get('sql', 'N/A'), language="sql")
-                st.caption(f"Session: {item.get('session_id', 'N/A')[:16]}...")
-    else:
-        st.info("📋 No queries yet. Ask a question to get started!")
+    render_history()
 
 with tab3:
     st.subheader("⚙️ Settings")
@@ -226,18 +408,29 @@ with tab3:
     
     if st.button("Test Connection"):
         try:
-            response = requests.get(f"{backend_url}/")
+            response = get_http().get(f"{backend_url}/", timeout=PING_TIMEOUT)
             if response.status_code == 200:
                 st.success("✅ Backend connected successfully!")
             else:
                 st.error("❌ Connection failed")
+        except requests.exceptions.ConnectTimeout:
+            st.error("❌ Backend unreachable — check URL")
         except:
             st.error("❌ Cannot reach backend")
     
     st.divider()
     
     st.markdown("**Display Options**")
-    max_rows = st.slider("Maximum rows to display", 10, 1000, 100)
+    max_rows = st.slider("Maximum rows to display", 10, 1000, 100, key="max_rows")
+    st.number_input(
+        "History limit",
+        min_value=1,
+        max_value=500,
+        value=HISTORY_LIMIT,
+        key="history_limit",
+        on_change=resize_history
+    )
+    st.checkbox("Bypass cache", key="bypass_cache", help="Clear cached answers and always ask the backend")
     
     st.divider()
     
@@ -251,9 +444,4 @@ with tab3:
 
 # Footer
 st.divider()
-st.markdown("""
-<div style='text-align: center; color: #666; padding: 1rem;'>
-    <p>Made with ❤️ using <b>FastAPI</b>, <b>Streamlit</b> & <b>Groq</b></p>
-    <p>🔒 All queries are validated for security | 🚀 Auto-recovery enabled</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(_FOOTER_HTML, unsafe_allow_html=True)